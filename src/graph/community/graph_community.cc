@@ -32,10 +32,13 @@ using namespace boost;
 using namespace graph_tool;
 
 
-void community_structure(GraphInterface& g, double gamma, string corr_name,
-                         size_t n_iter, double Tmin, double Tmax, size_t Nspins,
-                         rng_t& rng, bool verbose, string history_file,
-                         boost::any weight, boost::any property)
+python::object community_structure(GraphInterface& g, double gamma,
+                                   comm_corr_t corr, size_t n_iter,
+                                   double Tmin, double Tmax, size_t Nspins,
+                                   rng_t& rng, bool verbose,
+                                   string history_file, bool ret_history,
+                                   bool init_spins, boost::any weight,
+                                   boost::any property)
 {
     typedef property_map_types::apply<mpl::vector<int32_t,int64_t>,
                                       GraphInterface::vertex_index_map_t,
@@ -46,32 +49,30 @@ void community_structure(GraphInterface& g, double gamma, string corr_name,
         throw ValueException("vertex property is not of integer type int32_t "
                              "or int64_t");
 
-    typedef DynamicPropertyMapWrap<double,GraphInterface::edge_t> weight_map_t;
+    // the weight maps are dispatched on their actual types, so that the
+    // annealing loop is compiled separately for each of them, and the
+    // unweighted case reduces to a constant
     typedef ConstantPropertyMap<double,GraphInterface::edge_t> no_weight_map_t;
-    typedef mpl::vector<weight_map_t,no_weight_map_t> weight_properties;
+    typedef mpl::push_back<edge_scalar_properties, no_weight_map_t>::type
+        weight_properties;
 
     if (weight.empty())
         weight = no_weight_map_t(1.0);
-    else
-        weight = weight_map_t(weight, edge_scalar_properties());
-
-    comm_corr_t corr;
-    if (corr_name ==  "erdos")
-        corr = ERDOS_REYNI;
-    else if (corr_name == "uncorrelated")
-        corr = UNCORRELATED;
-    else if (corr_name == "correlated")
-        corr = CORRELATED;
-    else
-        throw ValueException("invalid correlation type: " + corr_name);
 
+    vector<double> history;
     run_action<graph_tool::detail::never_directed>()
-        (g, bind<void>(get_communities_selector(corr, g.GetVertexIndex()),
+        (g, bind<void>(get_communities_selector(corr, g.GetVertexIndex(),
+                                                init_spins,
+                                                ret_history ? &history : 0),
                        _1, _2, _3, gamma, n_iter,
                        make_pair(Tmin, Tmax), Nspins,
                        ref(rng), make_pair(verbose,history_file)),
          weight_properties(), allowed_spin_properties())
         (weight, property);
+
+    if (ret_history)
+        return wrap_vector_owned(history);
+    return python::object();
 }
 
 
@@ -86,6 +87,11 @@ double modularity(GraphInterface& g, boost::any weight, boost::any property)
     if(weight.empty())
         weight = weight_map_t(1);
 
+    typedef property_map_type::apply<python::object,
+                                     GraphInterface::vertex_index_map_t>::type
+        pyobject_map_t;
+    GILRelease gil(property.type() != typeid(pyobject_map_t));
+
     run_action<graph_tool::detail::never_directed>()
         (g, bind<void>(get_modularity(), _1, _2, _3, ref(modularity)),
          edge_props_t(), vertex_properties())
@@ -119,12 +125,21 @@ void community_network_eavg(GraphInterface& gi, GraphInterface& cgi,
                             bool self_loops);
 
 
+extern void louvain(GraphInterface& g, boost::any weight, boost::any property,
+                    boost::any frontier, double threshold, bool verbose);
+
 extern void export_blockmodel();
 
 BOOST_PYTHON_MODULE(libgraph_tool_community)
 {
+    enum_<comm_corr_t>("comm_corr")
+        .value("erdos", ERDOS_REYNI)
+        .value("uncorrelated", UNCORRELATED)
+        .value("correlated", CORRELATED);
+
     def("community_structure", &community_structure);
     def("modularity", &modularity);
+    def("louvain", &louvain);
     def("community_network", &community_network);
     def("community_network_vavg", &community_network_vavg);
     def("community_network_eavg", &community_network_eavg);
@@ -52,7 +52,8 @@ struct get_communities
     void operator()(const Graph& g, VertexIndex vertex_index, WeightMap weights,
                     CommunityMap s, double gamma, size_t n_iter,
                     pair<double, double> Tinterval, size_t n_spins, rng_t& rng,
-                    pair<bool, string> verbose) const
+                    pair<bool, string> verbose, bool init_spins,
+                    vector<double>* history) const
     {
         typedef typename graph_traits<Graph>::vertex_descriptor vertex_t;
         typedef typename graph_traits<Graph>::edge_descriptor edge_t;
@@ -79,12 +80,15 @@ struct get_communities
         unordered_map<size_t, size_t> Ns; // spin histogram
         CommunityMap temp_s(vertex_index, num_vertices(g));
 
-        // init spins from [0,N-1] and global info
+        // init spins from [0,N-1] and global info, unless continuing from a
+        // previous state
         tr1::uniform_int<size_t> sample_spin(0, n_spins-1);
         typename graph_traits<Graph>::vertex_iterator vi,vi_end;
         for (tie(vi,vi_end) = vertices(g); vi != vi_end; ++vi)
         {
-            s[*vi] = temp_s[*vi] = sample_spin(rng);
+            if (init_spins)
+                s[*vi] = sample_spin(rng);
+            temp_s[*vi] = s[*vi];
             Ns[s[*vi]]++;
         }
 
@@ -170,16 +174,17 @@ struct get_communities
                 Nnnks.Update(tr1::get<0>(*iter), tr1::get<1>(*iter),
                              tr1::get<2>(*iter));
 
+            // number of occupied spins
+            size_t ns = 0;
+            for (typeof(Ns.begin()) iter = Ns.begin(); iter != Ns.end(); ++iter)
+                if (iter->second > 0)
+                    ns++;
+
             if (verbose.first)
             {
                 for (size_t j = 0; j < out_str.str().length(); ++j)
                     cout << "\b";
                 out_str.str("");
-                size_t ns = 0;
-                for (typeof(Ns.begin()) iter = Ns.begin(); iter != Ns.end();
-                     ++iter)
-                    if (iter->second > 0)
-                        ns++;
                 out_str << setw(lexical_cast<string>(n_iter).size())
                         << temp_count << " of " << n_iter
                         << " (" << setw(2) << (temp_count+1)*100/n_iter
@@ -192,11 +197,6 @@ struct get_communities
             {
                 try
                 {
-                    size_t ns = 0;
-                    for (typeof(Ns.begin()) iter = Ns.begin(); iter != Ns.end();
-                         ++iter)
-                        if (iter->second > 0)
-                            ns++;
                     out_file << temp_count << "\t" << setprecision(10) << T
                              << "\t" << ns << "\t" << E << endl;
                 }
@@ -206,6 +206,13 @@ struct get_communities
                                       verbose.second + ": " + e.what());
                 }
             }
+            if (history != 0)
+            {
+                history->push_back(temp_count);
+                history->push_back(T);
+                history->push_back(ns);
+                history->push_back(E);
+            }
         }
 
         if (n_iter % 2 != 0)
@@ -455,10 +462,14 @@ enum comm_corr_t
 struct get_communities_selector
 {
     get_communities_selector(comm_corr_t corr,
-                             GraphInterface::vertex_index_map_t index)
-        : _corr(corr), _index(index) {}
+                             GraphInterface::vertex_index_map_t index,
+                             bool init_spins, vector<double>* history)
+        : _corr(corr), _index(index), _init_spins(init_spins),
+          _history(history) {}
     comm_corr_t _corr;
     GraphInterface::vertex_index_map_t _index;
+    bool _init_spins;
+    vector<double>* _history;
 
     template <class Graph, class WeightMap, class CommunityMap>
     void operator()(const Graph& g, WeightMap weights, CommunityMap s,
@@ -471,15 +482,17 @@ struct get_communities_selector
         case ERDOS_REYNI:
             get_communities<NNKSErdosReyni>()(g, _index, weights, s, gamma,
                                               n_iter, Tinterval, Nspins, rng,
-                                              verbose);
+                                              verbose, _init_spins, _history);
             break;
         case UNCORRELATED:
             get_communities<NNKSUncorr>()(g, _index, weights, s, gamma, n_iter,
-                                          Tinterval, Nspins, rng, verbose);
+                                          Tinterval, Nspins, rng, verbose,
+                                          _init_spins, _history);
             break;
         case CORRELATED:
             get_communities<NNKSCorr>()(g, _index, weights, s, gamma, n_iter,
-                                        Tinterval, Nspins, rng, verbose);
+                                        Tinterval, Nspins, rng, verbose,
+                                        _init_spins, _history);
             break;
         }
     }
@@ -0,0 +1,66 @@
+// graph-tool -- a general graph modification and manipulation thingy
+//
+// Copyright (C) 2006-2013 Tiago de Paula Peixoto <tiago@skewed.de>
+//
+// This program is free software; you can redistribute it and/or
+// modify it under the terms of the GNU General Public License
+// as published by the Free Software Foundation; either version 3
+// of the License, or (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#include "graph_python_interface.hh"
+#include "graph_filtering.hh"
+#include "graph.hh"
+#include "graph_selectors.hh"
+#include "graph_properties.hh"
+
+#include <boost/bind.hpp>
+#include <boost/bind/placeholders.hpp>
+#include <boost/mpl/push_back.hpp>
+
+#include "graph_community_louvain.hh"
+
+using namespace std;
+using namespace boost;
+
+using namespace graph_tool;
+
+void louvain(GraphInterface& g, boost::any weight, boost::any property,
+             boost::any frontier, double threshold, bool verbose)
+{
+    typedef property_map_types::apply<mpl::vector<int32_t,int64_t>,
+                                      GraphInterface::vertex_index_map_t,
+                                      mpl::bool_<false> >::type
+        allowed_spin_properties;
+
+    if (!belongs<allowed_spin_properties>()(property))
+        throw ValueException("vertex property is not of integer type int32_t "
+                             "or int64_t");
+
+    if (num_vertices(g.GetGraph()) > size_t(numeric_limits<int>::max()))
+        throw ValueException("graph has too many vertices (at most " +
+                             lexical_cast<string>(numeric_limits<int>::max()) +
+                             " are supported)");
+
+    typedef ConstantPropertyMap<double,GraphInterface::edge_t> weight_map_t;
+    typedef mpl::push_back<edge_scalar_properties, weight_map_t>::type
+        edge_props_t;
+
+    if(weight.empty())
+        weight = weight_map_t(1.0);
+
+    GILRelease gil;
+
+    run_action<graph_tool::detail::never_directed>()
+        (g, bind<void>(get_louvain(), _1, g.GetVertexIndex(), _2, _3,
+                       frontier, threshold, verbose),
+         edge_props_t(), allowed_spin_properties())
+        (weight, property);
+}
@@ -0,0 +1,565 @@
+// graph-tool -- a general graph modification and manipulation thingy
+//
+// Copyright (C) 2006-2013 Tiago de Paula Peixoto <tiago@skewed.de>
+//
+// This program is free software; you can redistribute it and/or
+// modify it under the terms of the GNU General Public License
+// as published by the Free Software Foundation; either version 3
+// of the License, or (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#ifndef GRAPH_COMMUNITY_LOUVAIN_HH
+#define GRAPH_COMMUNITY_LOUVAIN_HH
+
+#include "tr1_include.hh"
+#include TR1_HEADER(unordered_map)
+
+#include <iostream>
+#include <limits>
+
+#include "graph_util.hh"
+#include "graph_properties.hh"
+
+#ifdef USING_OPENMP
+#include <omp.h>
+#endif
+
+namespace graph_tool
+{
+
+using namespace std;
+using namespace boost;
+
+using std::tr1::unordered_map;
+
+// computes a community partition which maximizes Newman's modularity, using
+// the multi-level "Louvain" method of Blondel et al. The graph is copied into a
+// compressed adjacency list, which is successively condensed into the network
+// of communities found at each level. Vertices and communities are stored as
+// 32-bit integers (see get_louvain below), and the edge weights, which make up
+// most of the data read by the sweeps, in single precision. Degrees, community
+// totals and all sums are kept in double precision, so the rounding only
+// affects the choice between moves with nearly equal gains.
+
+template <class Vertex>
+struct louvain_graph
+{
+    vector<size_t> idx;   // offset of the out-neighbours of each vertex
+    vector<Vertex> nbrs;  // out-neighbours
+    vector<float> w;      // edge weights
+    vector<double> loop;  // self-loop weights, kept out of the adjacency
+    vector<double> k;     // (weighted) degrees, including self-loops
+
+    size_t size() const { return k.size(); }
+};
+
+// accumulates the weight of the edges from a vertex towards each neighbouring
+// community. This is a hash table with open addressing and linear probing,
+// allocated for the maximum degree, where only the used slots are cleared
+// between vertices. Each vertex only hashes into the leading slots of the
+// table, in a power-of-two range sized to its own degree (see start()), so
+// that low-degree vertices stay within a few cache lines even when a hub
+// makes the whole table large.
+template <class Vertex>
+class louvain_comm_weights
+{
+public:
+    louvain_comm_weights(size_t max_k)
+    {
+        start(max_k);
+        _keys.resize(_mask + 1, numeric_limits<Vertex>::max());
+        _vals.resize(_mask + 1, 0);
+    }
+
+    // restricts the table to the range needed for at most k distinct keys
+    // (k must not exceed the size given to the constructor). Must only be
+    // called when the table is empty.
+    void start(size_t k)
+    {
+        size_t cap = 1;
+        _shift = 64;
+        while (cap < 2 * k)
+        {
+            cap <<= 1;
+            --_shift;
+        }
+        _mask = cap - 1;
+    }
+
+    void add(Vertex r, double w)
+    {
+        size_t i = slot(r);
+        while (_keys[i] != r)
+        {
+            if (_keys[i] == numeric_limits<Vertex>::max())
+            {
+                _keys[i] = r;
+                _used.push_back(i);
+                break;
+            }
+            i = (i + 1) & _mask;
+        }
+        _vals[i] += w;
+    }
+
+    double get(Vertex r) const
+    {
+        for (size_t i = slot(r); _keys[i] != numeric_limits<Vertex>::max();
+             i = (i + 1) & _mask)
+            if (_keys[i] == r)
+                return _vals[i];
+        return 0;
+    }
+
+    size_t size() const { return _used.size(); }
+    Vertex key(size_t j) const { return _keys[_used[j]]; }
+    double val(size_t j) const { return _vals[_used[j]]; }
+
+    void clear()
+    {
+        for (size_t j = 0; j < _used.size(); ++j)
+        {
+            _keys[_used[j]] = numeric_limits<Vertex>::max();
+            _vals[_used[j]] = 0;
+        }
+        _used.clear();
+    }
+
+private:
+    // Fibonacci hashing
+    size_t slot(Vertex r) const
+    {
+        return _shift < 64 ?
+            size_t((uint64_t(r) * 0x9E3779B97F4A7C15ULL) >> _shift) : 0;
+    }
+
+    vector<Vertex> _keys;
+    vector<double> _vals;
+    vector<size_t> _used;
+    size_t _mask;
+    size_t _shift;
+};
+
+// returns the neighbouring community of vertex i which gives the largest
+// increase in modularity, the corresponding gain, and the difference between
+// the weight of the edges towards that community and towards the current one
+// (the current community is returned if no move increases it)
+template <class Vertex>
+Vertex louvain_best_move(const louvain_graph<Vertex>& lg,
+                         const vector<Vertex>& c, const vector<double>& tot,
+                         double m, size_t i, louvain_comm_weights<Vertex>& kc,
+                         double& gain, double& dk)
+{
+    Vertex r = c[i];
+
+    // if all the neighbours are in the same community as the vertex, there is
+    // nothing to gain, and the hash table is not needed
+    size_t j = lg.idx[i];
+    double kr = 0;
+    for (; j < lg.idx[i + 1] && c[lg.nbrs[j]] == r; ++j)
+        kr += lg.w[j];
+    gain = dk = 0;
+    if (j == lg.idx[i + 1])
+        return r;
+
+    kc.start(lg.idx[i + 1] - lg.idx[i]);
+    if (j > lg.idx[i])
+        kc.add(r, kr);
+    for (; j < lg.idx[i + 1]; ++j)
+        kc.add(c[lg.nbrs[j]], lg.w[j]);
+
+    double ki = lg.k[i];
+    double ki_m = ki / m;
+    kr = kc.get(r);
+    double base = kr - ki_m * (tot[r] - ki);
+
+    // the vertex's own community is not singled out: with ki removed from its
+    // total, its gain is exactly zero, so it can never be selected over the
+    // current one. The selection is written so that it compiles to conditional
+    // moves.
+    Vertex nr = r;
+    double knr = kr;
+    for (j = 0; j < kc.size(); ++j)
+    {
+        Vertex t = kc.key(j);
+        double kt = kc.val(j);
+        double dg = kt - ki_m * (tot[t] - (t == r) * ki) - base;
+        nr = (dg > gain) ? t : nr;
+        knr = (dg > gain) ? kt : knr;
+        gain = max(gain, dg);
+    }
+    dk = knr - kr;
+    kc.clear();
+    return nr;
+}
+
+// moves each vertex to the neighbouring community which gives the largest
+// increase in modularity, until the total increase in a full sweep falls below
+// the threshold. In each sweep, the best moves are first evaluated in parallel
+// against a fixed state, and the vertices which would move are then checked
+// again and moved serially, in order, so that the result does not depend on the
+// number of threads. The difference between the weights towards the proposed
+// and the current community is kept up to date as the neighbours move, so that
+// the gain of a proposed move is recomputed in constant time, with the current
+// community totals. The move is only re-evaluated from scratch if a neighbour
+// has moved in the meantime to some other community, which may now be a better
+// choice. Only the vertices marked as active are considered, and the
+// neighbours of each vertex which is moved are marked for the next sweep, so
+// that the later sweeps only visit the regions which still change. Returns the
+// total increase.
+template <class Vertex>
+double louvain_move(const louvain_graph<Vertex>& lg, vector<Vertex>& c,
+                    vector<double>& tot, double m, double threshold,
+                    vector<uint8_t>& active)
+{
+    int i, N = lg.size();
+    size_t max_k = 0;
+    for (i = 0; i < N; ++i)
+        max_k = max(max_k, lg.idx[i + 1] - lg.idx[i]);
+
+    // one table per thread, allocated once and reused by all the sweeps,
+    // since the later ones only visit a few vertices
+    size_t nt = 1;
+    #ifdef USING_OPENMP
+    nt = omp_get_max_threads();
+    #endif
+    vector<louvain_comm_weights<Vertex> >
+        kcs(nt, louvain_comm_weights<Vertex>(max_k));
+
+    vector<Vertex> best(N);
+    vector<double> dk(N);
+    vector<uint8_t> stale(N, false);
+    double total = 0, dQ;
+    do
+    {
+        dQ = 0;
+        #pragma omp parallel default(shared) private(i) if (N > 100)
+        {
+            size_t tid = 0;
+            #ifdef USING_OPENMP
+            tid = omp_get_thread_num();
+            #endif
+            louvain_comm_weights<Vertex>& tkc = kcs[tid];
+
+            #pragma omp for schedule(dynamic, 1024)
+            for (i = 0; i < N; ++i)
+            {
+                best[i] = c[i];
+                stale[i] = false;
+                if (!active[i])
+                    continue;
+                active[i] = false;
+                double gain;
+                best[i] = louvain_best_move(lg, c, tot, m, i, tkc, gain,
+                                            dk[i]);
+            }
+        }
+
+        for (i = 0; i < N; ++i)
+        {
+            if (best[i] == c[i])
+                continue;
+
+            double gain;
+            Vertex r = c[i];
+            Vertex nr = best[i];
+            if (stale[i])
+            {
+                double dki;
+                nr = louvain_best_move(lg, c, tot, m, i, kcs[0], gain, dki);
+                if (nr == r)
+                    continue;
+            }
+            else
+            {
+                double ki = lg.k[i];
+                gain = dk[i] - ki / m * (tot[nr] - tot[r] + ki);
+                if (gain <= 0)
+                    continue;
+            }
+
+            tot[r] -= lg.k[i];
+            tot[nr] += lg.k[i];
+            c[i] = nr;
+            dQ += 2 * gain / m;
+
+            for (size_t j = lg.idx[i]; j < lg.idx[i + 1]; ++j)
+            {
+                Vertex u = lg.nbrs[j];
+                active[u] = true;
+                dk[u] += lg.w[j] * (int(nr == best[u]) - int(r == best[u]) -
+                                    int(nr == c[u]) + int(r == c[u]));
+                if (nr != best[u] && nr != c[u])
+                    stale[u] = true;
+            }
+        }
+        total += dQ;
+    }
+    while (dQ > threshold);
+    return total;
+}
+
+// relabels the communities contiguously, starting from zero, and returns their
+// number
+template <class Vertex>
+size_t louvain_renumber(vector<Vertex>& c)
+{
+    vector<Vertex> ids(c.size(), numeric_limits<Vertex>::max());
+    size_t B = 0;
+    for (size_t i = 0; i < c.size(); ++i)
+    {
+        if (ids[c[i]] == numeric_limits<Vertex>::max())
+            ids[c[i]] = B++;
+        c[i] = ids[c[i]];
+    }
+    return B;
+}
+
+// builds the network of communities, where each edge weight is the total weight
+// of the edges between the two communities, and the edges inside a community
+// (including the self-loops of its members) become its self-loop weight. The
+// vertices are first bucketed by community with a counting sort, and the edges
+// of each community are then coalesced in a per-thread hash table, using a
+// range sized to the total degree of its members, so that the scratch memory
+// does not grow with the number of communities. The communities are processed
+// in parallel, each writing to a slot bounded by the same total degree, and
+// the result is compacted afterwards.
+template <class Vertex>
+void louvain_aggregate(const louvain_graph<Vertex>& lg, const vector<Vertex>& c,
+                       size_t B, louvain_graph<Vertex>& cg)
+{
+    vector<size_t> cidx(B + 1, 0), hidx(B + 1, 0);
+    for (size_t i = 0; i < lg.size(); ++i)
+    {
+        cidx[c[i] + 1]++;
+        hidx[c[i] + 1] += lg.idx[i + 1] - lg.idx[i];
+    }
+    for (size_t r = 0; r < B; ++r)
+    {
+        cidx[r + 1] += cidx[r];
+        hidx[r + 1] += hidx[r];
+    }
+    vector<size_t> pos(cidx.begin(), cidx.end() - 1);
+    vector<Vertex> members(lg.size());
+    for (size_t i = 0; i < lg.size(); ++i)
+        members[pos[c[i]]++] = i;
+
+    vector<Vertex> hnbrs(hidx[B]);
+    vector<float> hw(hidx[B]);
+    vector<size_t> hsize(B);
+    cg.loop.assign(B, 0);
+    cg.k.assign(B, 0);
+
+    // a community has at most as many neighbouring communities as the total
+    // degree of its members
+    size_t max_row = 0;
+    for (size_t r = 0; r < B; ++r)
+        max_row = max(max_row, min(B, hidx[r + 1] - hidx[r]));
+
+    int r, NB = B;
+    #pragma omp parallel default(shared) private(r) if (NB > 100)
+    {
+        louvain_comm_weights<Vertex> kc(max_row);
+
+        #pragma omp for schedule(dynamic, 64)
+        for (r = 0; r < NB; ++r)
+        {
+            kc.start(min(B, hidx[r + 1] - hidx[r]));
+            double loop = 0;
+            for (size_t l = cidx[r]; l < cidx[r + 1]; ++l)
+            {
+                Vertex i = members[l];
+                loop += lg.loop[i];
+                for (size_t j = lg.idx[i]; j < lg.idx[i + 1]; ++j)
+                {
+                    Vertex t = c[lg.nbrs[j]];
+                    if (t == Vertex(r))
+                        loop += lg.w[j];
+                    else
+                        kc.add(t, lg.w[j]);
+                }
+            }
+
+            for (size_t l = 0; l < kc.size(); ++l)
+            {
+                hnbrs[hidx[r] + l] = kc.key(l);
+                hw[hidx[r] + l] = kc.val(l);
+                cg.k[r] += kc.val(l);
+            }
+            cg.loop[r] = loop;
+            cg.k[r] += loop;
+            hsize[r] = kc.size();
+            kc.clear();
+        }
+    }
+
+    cg.idx.assign(B + 1, 0);
+    for (size_t r = 0; r < B; ++r)
+        cg.idx[r + 1] = cg.idx[r] + hsize[r];
+    cg.nbrs.resize(cg.idx[B]);
+    cg.w.resize(cg.idx[B]);
+
+    #pragma omp parallel for default(shared) private(r) \
+        schedule(static) if (NB > 100)
+    for (r = 0; r < NB; ++r)
+    {
+        copy(hnbrs.begin() + hidx[r], hnbrs.begin() + hidx[r] + hsize[r],
+             cg.nbrs.begin() + cg.idx[r]);
+        copy(hw.begin() + hidx[r], hw.begin() + hidx[r] + hsize[r],
+             cg.w.begin() + cg.idx[r]);
+    }
+}
+
+struct get_louvain
+{
+    // vertices and communities are labelled with 32-bit integers, which halves
+    // the memory traffic of the sweeps. Since the parallel loops use int
+    // counters, the caller must ensure that the graph has at most INT_MAX
+    // vertices.
+    template <class Graph, class VertexIndex, class WeightMap,
+              class CommunityMap>
+    void operator()(const Graph& g, VertexIndex vertex_index, WeightMap weights,
+                    CommunityMap s, boost::any frontier, double threshold,
+                    bool verbose) const
+    {
+        typedef typename graph_traits<Graph>::vertex_descriptor vertex_t;
+        typedef uint32_t label_t;
+        typedef typename property_traits<CommunityMap>::value_type s_val_t;
+        typedef property_map_type
+            ::apply<uint8_t, GraphInterface::vertex_index_map_t>::type
+            frontier_map_t;
+
+        unchecked_vector_property_map<label_t,VertexIndex>
+            index_map(vertex_index, num_vertices(g));
+
+        // relabel the vertices and the initial partition contiguously
+        vector<label_t> c;
+        unordered_map<s_val_t, label_t> ids;
+        size_t N = 0;
+        typename graph_traits<Graph>::vertex_iterator v, v_end;
+        for (tie(v, v_end) = vertices(g); v != v_end; ++v)
+        {
+            index_map[*v] = N++;
+            typeof(ids.begin()) iter = ids.find(s[*v]);
+            if (iter == ids.end())
+            {
+                label_t id = ids.size();
+                iter = ids.insert(make_pair(s[*v], id)).first;
+            }
+            c.push_back(iter->second);
+        }
+
+        // copy the graph, ignoring self-loops as done by modularity(). The
+        // offsets are obtained from the degrees, so that the adjacency lists
+        // can then be filled in parallel
+        louvain_graph<label_t> lg;
+        lg.idx.assign(N + 1, 0);
+        lg.loop.assign(N, 0);
+        lg.k.resize(N);
+
+        int i, NV = num_vertices(g);
+        #pragma omp parallel for default(shared) private(i) \
+            schedule(static) if (NV > 100)
+        for (i = 0; i < NV; ++i)
+        {
+            vertex_t u = vertex(i, g);
+            if (u == graph_traits<Graph>::null_vertex())
+                continue;
+            lg.idx[index_map[u] + 1] = out_degree_no_loops(u, g);
+        }
+        for (size_t j = 0; j < N; ++j)
+            lg.idx[j + 1] += lg.idx[j];
+        lg.nbrs.resize(lg.idx[N]);
+        lg.w.resize(lg.idx[N]);
+
+        #pragma omp parallel for default(shared) private(i) \
+            schedule(dynamic, 1024) if (NV > 100)
+        for (i = 0; i < NV; ++i)
+        {
+            vertex_t u = vertex(i, g);
+            if (u == graph_traits<Graph>::null_vertex())
+                continue;
+            size_t j = lg.idx[index_map[u]];
+            double k = 0;
+            typename graph_traits<Graph>::out_edge_iterator e, e_end;
+            for (tie(e, e_end) = out_edges(u, g); e != e_end; ++e)
+            {
+                if (target(*e, g) == u)
+                    continue;
+                double ew = get(weights, *e);
+                lg.nbrs[j] = index_map[target(*e, g)];
+                lg.w[j++] = ew;
+                k += ew;
+            }
+            lg.k[index_map[u]] = k;
+        }
+
+        // if a frontier is given, only the vertices in it are initially
+        // considered for moves in the first level, otherwise all of them
+        vector<uint8_t> active(N, true);
+        if (!frontier.empty())
+        {
+            frontier_map_t fmap = any_cast<frontier_map_t>(frontier);
+            for (tie(v, v_end) = vertices(g); v != v_end; ++v)
+                active[index_map[*v]] = fmap[*v];
+        }
+
+        // the total weight is preserved by the condensation
+        double m = 0;
+        for (size_t i = 0; i < N; ++i)
+            m += lg.k[i];
+        if (m == 0)
+            return;
+
+        // community of each original vertex
+        vector<label_t> top(N);
+        for (size_t i = 0; i < N; ++i)
+            top[i] = i;
+
+        for (size_t level = 0; ; ++level)
+        {
+            vector<double> tot(lg.size(), 0);
+            for (size_t i = 0; i < lg.size(); ++i)
+                tot[c[i]] += lg.k[i];
+            if (level > 0)
+                active.assign(lg.size(), true);
+
+            double dQ = louvain_move(lg, c, tot, m, threshold, active);
+            size_t B = louvain_renumber(c);
+            for (size_t i = 0; i < N; ++i)
+                top[i] = c[top[i]];
+
+            if (verbose)
+                cout << "level " << level << ": " << B << " communities, "
+                     << "modularity increase: " << dQ << endl;
+
+            // when updating from a frontier, the previous partition is kept if
+            // the first level does not change it, instead of condensing the
+            // whole graph
+            if (B == lg.size() ||
+                (dQ <= threshold && (level > 0 || !frontier.empty())))
+                break;
+
+            louvain_graph<label_t> cg;
+            louvain_aggregate(lg, c, B, cg);
+            swap(lg, cg);
+            for (size_t r = 0; r < B; ++r)
+                c[r] = r;
+            c.resize(B);
+        }
+
+        for (tie(v, v_end) = vertices(g); v != v_end; ++v)
+            s[*v] = top[index_map[*v]];
+    }
+};
+
+} // graph_tool namespace
+
+#endif // GRAPH_COMMUNITY_LOUVAIN_HH
@@ -545,6 +545,32 @@ python::object new_property(const string& type, IndexMap index_map,
     return prop;
 }
 
+//
+// Release the GIL
+//
+
+// releases the global interpreter lock for the lifetime of the object, so that
+// other python threads can run during long computations. This must not be
+// used if python objects are accessed in the meantime.
+class GILRelease
+{
+public:
+    GILRelease(bool release = true): _state(0)
+    {
+        if (release)
+            _state = PyEval_SaveThread();
+    }
+
+    ~GILRelease()
+    {
+        if (_state != 0)
+            PyEval_RestoreThread(_state);
+    }
+
+private:
+    PyThreadState* _state;
+};
+
 } //graph_tool namespace
 
 #endif
@@ -78,6 +78,7 @@ dl_import("from . import libgraph_tool_community")
 
 from .. import _degree, _prop, Graph, GraphView, libcore, _get_rng
 import random
+import numpy
 import sys
 
 __all__ = ["minimize_blockmodel_dl", "BlockState", "mcmc_sweep",
@@ -92,7 +93,7 @@ from . blockmodel import minimize_blockmodel_dl, BlockState, mcmc_sweep, \
 
 def community_structure(g, n_iter, n_spins, gamma=1.0, corr="erdos",
                         spins=None, weight=None, t_range=(100.0, 0.01),
-                        verbose=False, history_file=None):
+                        verbose=False, history_file=None, ret_history=False):
     r"""
     Obtain the community structure for the given graph, using a Potts model approach.
 
@@ -109,9 +110,10 @@ def community_structure(g, n_iter, n_spins, gamma=1.0, corr="erdos",
     corr : string (optional, default: "erdos")
         Type of correlation to be assumed: Either "erdos", "uncorrelated" and
         "correlated".
-    spins : :class:`~graph_tool.PropertyMap`
+    spins : :class:`~graph_tool.PropertyMap` (optional, default: None)
         Vertex property maps to store the spin variables. If this is specified,
-        the values will not be initialized to a random value.
+        the values will not be initialized to a random value, and are used as
+        the starting state of the annealing.
     weight : :class:`~graph_tool.PropertyMap` (optional, default: None)
         Edge property map with the optional edge weights.
     t_range : tuple of floats (optional, default: (100.0, 0.01))
@@ -120,11 +122,17 @@ def community_structure(g, n_iter, n_spins, gamma=1.0, corr="erdos",
         Display verbose information.
     history_file : string (optional, default: None)
         History file to keep information about the simulated annealing.
+    ret_history : bool (optional, default: False)
+        If true, the history of the simulated annealing is also returned.
 
     Returns
     -------
     spins : :class:`~graph_tool.PropertyMap`
         Vertex property map with the spin values.
+    history : :class:`~numpy.ndarray`
+        Array with one row per iteration, and the same columns as the history
+        file: iteration, temperature, number of spins and energy. Only returned
+        if ``ret_history == True``.
 
     See Also
     --------
@@ -165,15 +173,18 @@ def community_structure(g, n_iter, n_spins, gamma=1.0, corr="erdos",
     specific graph. To help with this, the `history` option can be used, which
     saves to a chosen file the temperature and number of spins per iteration,
     which can be used to determined whether or not the algorithm converged to
-    the optimal solution. Also, the `verbose` option prints the computation
-    status on the terminal.
+    the optimal solution. The same information can be obtained directly as an
+    array, without writing a file, with the `ret_history` option. Also, the
+    `verbose` option prints the computation status on the terminal.
 
     .. note::
 
         If the spin property already exists before the computation starts, it's
         not re-sampled at the beginning. This means that it's possible to
         continue a previous run, if you saved the graph, by properly setting
-        `t_range` value, and using the same `spin` property.
+        `t_range` value, and using the same `spin` property. This is also the
+        cheapest way of sweeping over parameters such as `gamma`, since each
+        run starts from the state reached by the previous one.
 
     If enabled during compilation, this algorithm runs in parallel.
 
@@ -261,17 +272,29 @@ def community_structure(g, n_iter, n_spins, gamma=1.0, corr="erdos",
     .. _simulated annealing: http://en.wikipedia.org/wiki/Simulated_annealing
     """
 
-    if spins is None:
+    init_spins = spins is None
+    if init_spins:
         spins = g.new_vertex_property("int32_t")
     if history_file is None:
         history_file = ""
-    ug = GraphView(g, directed=False)
-    libgraph_tool_community.community_structure(ug._Graph__graph, gamma, corr,
-                                                n_iter, t_range[1], t_range[0],
-                                                n_spins, _get_rng(),
-                                                verbose, history_file,
-                                                _prop("e", ug, weight),
-                                                _prop("v", ug, spins))
+    try:
+        corr = libgraph_tool_community.comm_corr.names[corr]
+    except KeyError:
+        raise ValueError("invalid correlation type: %s" % corr)
+    if g.is_directed():
+        ug = GraphView(g, directed=False, skip_properties=True)
+    else:
+        ug = g
+    hist = libgraph_tool_community.community_structure(ug._Graph__graph, gamma,
+                                                       corr, n_iter,
+                                                       t_range[1], t_range[0],
+                                                       n_spins, _get_rng(),
+                                                       verbose, history_file,
+                                                       ret_history, init_spins,
+                                                       _prop("e", g, weight),
+                                                       _prop("v", g, spins))
+    if ret_history:
+        return spins, hist.reshape((-1, 4))
     return spins
 
 
@@ -312,7 +335,10 @@ def modularity(g, prop, weight=None):
     where :math:`e_{rs}` is the fraction of edges which fall between
     vertices with spin s and r.
 
-    If enabled during compilation, this algorithm runs in parallel.
+    If enabled during compilation, this algorithm runs in parallel. Unless the
+    partition is stored in a ``python::object`` property map, the Python global
+    interpreter lock is released during the computation, so several calls can
+    also be run concurrently from different threads.
 
     Examples
     --------
@@ -331,14 +357,18 @@ def modularity(g, prop, weight=None):
        :doi:`10.1073/pnas.0601602103`, :arxiv:`physics/0602124`
     """
 
-    ug = GraphView(g, directed=False)
+    if g.is_directed():
+        ug = GraphView(g, directed=False, skip_properties=True)
+    else:
+        ug = g
     m = libgraph_tool_community.modularity(ug._Graph__graph,
-                                           _prop("e", ug, weight),
-                                           _prop("v", ug, prop))
+                                           _prop("e", g, weight),
+                                           _prop("v", g, prop))
     return m
 
 ####EXPERIMENTAL
-def louvain(g, weight=None, partition=None, threshold=0.00001, verbose=False):
+def louvain(g, weight=None, partition=None, threshold=0.00001, verbose=False,
+            frontier=None):
     r"""
     Calculate a community partition using the Louvain method based
     on modularity maximization.
@@ -355,6 +385,12 @@ def louvain(g, weight=None, partition=None, threshold=0.00001, verbose=False):
         The threshold used to stop the algorithm.
     verbose : boolean (optional, default: False)
         Enables the verbose evaluation of the algorithm.
+    frontier : :class:`~graph_tool.PropertyMap` (optional, default: None)
+        Boolean vertex property map marking the vertices affected by changes
+        made to the graph after `partition` was obtained, e.g. the endpoints of
+        inserted or removed edges. If given, only these vertices, and the
+        neighbours of the vertices which change community, are considered for
+        moves in the first level. Requires `partition`.
 
     Returns
     -------
@@ -384,7 +420,43 @@ def louvain(g, weight=None, partition=None, threshold=0.00001, verbose=False):
     
     .. note ::
         The quality of the partition returned by the algorithm depends on the
-        order in which the nodes are considered.
+        order in which the nodes are considered. The edge weights are stored
+        internally in single precision, so when two moves have nearly equal
+        gains, the one chosen may differ from an exact computation.
+
+    If the graph changes slightly, the partition can be updated incrementally
+    by passing the previous result as `partition` and marking the affected
+    vertices in `frontier`. The first level then only visits the regions
+    around the affected vertices, and if none of them changes community, the
+    partition is returned without condensing the graph. The graph is still
+    copied into an internal representation on every call, which takes time
+    proportional to its size, but this is usually much faster than starting
+    from scratch.
+
+    If enabled during compilation, this algorithm runs in parallel. The Python
+    global interpreter lock is released during the computation, so several
+    calls can also be run concurrently from different threads.
+
+    Examples
+    --------
+
+    This example uses the network :download:`community.xml <community.xml>`.
+
+    >>> g = gt.load_graph("community.xml")
+    >>> part = gt.louvain(g)
+    >>> round(gt.modularity(g, part), 6)
+    0.535314
+
+    After a small change to the graph, the partition can be updated starting
+    from the previous one, considering only the endpoints of the new edge:
+
+    >>> u, v = g.vertex(0), g.vertex(255)
+    >>> e = g.add_edge(u, v)
+    >>> frontier = g.new_vertex_property("bool")
+    >>> frontier[u] = frontier[v] = True
+    >>> part = gt.louvain(g, partition=part, frontier=frontier)
+    >>> round(gt.modularity(g, part), 6)
+    0.535181
         
     References
     ----------
@@ -393,208 +465,30 @@ def louvain(g, weight=None, partition=None, threshold=0.00001, verbose=False):
        Experiment 2008.10 (2008): P10008,
        :doi:`10.1088/1742-5468/2008/10/P10008` :arxiv:`physics/0803.0476`
     """
-    if type(g) is not Graph:
-        raise TypeError('Method must be used on graph_tool undirected graphs')
-    
-    if g.is_directed():
+    if not isinstance(g, Graph) or g.is_directed():
         raise TypeError('Method must be used on graph_tool undirected graphs')
-
-    #if the graph has no edges...
-    if g.num_edges()==0:
-        if verbose:
-            print("The graph has no edges...")
-        #... if there is already a partition, return the same
-        if partition:
-            if verbose:
-                print("Returning input partition")
-            return partition
-        else:
-            #... otherwise, each vertex goes into its own community
-            comm = g.vertex_index.copy('int')
-            if verbose:
-                print("Returning single nodes partition")
-            return comm
-
-    if partition:
-        #in case a partition was provided, use the condensation graph
-        if verbose:
-            print("Evaluating condensation graph")
-        work_graph, old_partition, part_sizes, weight, va, ea = condensation_graph(g, partition, eweight=weight)
+    if frontier is not None:
+        if partition is None:
+            raise ValueError('A frontier requires an initial partition')
+        if frontier.value_type() != "bool":
+            frontier = frontier.copy("bool")
+
+    #if the graph has no edges, there is nothing to optimize
+    no_edges = g.num_edges() == 0
+    if partition is not None:
+        #start from the provided partition
+        new_partition = partition.copy()
+        if no_edges:
+            return new_partition
     else:
         #otherwise, each vertex goes into its own community
-        if verbose:
-            print("Copying graph")
-        work_graph = g.copy()
-        old_partition = g.vertex_index.copy('int')
-
-    dendo = [old_partition]
-    #perform the evaluation
-    if verbose:
-        print("Evaluating 1 step")
-
-    kw = work_graph.degree_property_map('total',weight)
-    #this is the same no matter the level in the dendogram
-    m = sum(kw.a)
-    
-    new_partition = louvain_step(work_graph,old_partition,threshold,weight,m,kw,verbose)
-    thepart = g.copy_property(new_partition)
-    dendo.append(thepart)
-
-    return dendo
-
-def louvain_step(g,partition,threshold,weight=None,m=None,kw=None,verbose=False):
-    #(weighted) degree of the nodes
-    if verbose:
-        print("Evaluating degrees")
-    if not kw:
-        kw = g.degree_property_map('total',weight)
-    #result
-    new_partition = g.copy_property(partition)
-    #trading memory for speed
-    c2v = reverse_dict(new_partition,g.vertices())
-    #temporary, it leads to numerical errors **WARNING**
-    if not m:
-        m = sum(kw.a)
-    if verbose:
-        print("2m=",m)        
-
-    neigh = dict((v,set(v.all_neighbours())) for v in g.vertices())
-    for v in g.vertices():
-        #for all the neighbours
-        if v in neigh[v]:
-            neigh[v].remove(v)
-
-    #a fictional change just to enter the loop
-    changed = True
-    #until the increase is below the threshold
-    while changed:
-        if verbose:
-            print("The partition has changed...")
-        changed = False
-        #for each node
-        for v in g.vertices():
-            if verbose:
-                print("Evaluating node",v)
-            increase = (0.0,)
-            #the current community
-            current_comm = new_partition[v]
-            if verbose:
-                print("Current community is ",current_comm)
-            s2 = sum([kw[vv] for vv in c2v[current_comm]])-kw[v]
-                     
-            d = sum([weight[e] for e in v.all_edges() if e.target() in c2v[current_comm]])
-            ee = g.edge(v,v)
-            if ee:
-                d -= weight[ee]
-#            if verbose:
-#                print("s2=",s2,"\nd=",d)
-            #the new community, the same for the moment
-            newcom = new_partition[v]
-            
-            #set of neighbouring communities
-            neighcomms = set([new_partition[vv] for vv in neigh[v]])
-            if current_comm in neighcomms:
-                neighcomms.remove(current_comm)
-            if verbose:
-                print("Neighbouring communities:",neighcomms)
-            for n in neighcomms:
-                #evaluate the increase in modularity
-                deltaq = deltas(g,v,new_partition,c2v,
-                                n,s2,d,
-                                weight,kw,m)
-                if verbose:
-                    print("Moving to community ",n," gives ",deltaq[0])
-                #if the increase is better than the previous one
-                if deltaq[0] > increase[0]:
-                    if verbose:
-                        print("Which is higer than ",increase[0])
-                    increase = deltaq
-                    newcom = n
-            #if the increase is above the threshold
-            if (increase[0]>threshold):
-                if verbose:
-                    print(increase[0]," > ",threshold,": changing community to ",newcom)
-                c2v[current_comm].remove(v)
-                new_partition[v]=newcom
-                c2v[newcom].add(v)
-                changed = True
-
+        new_partition = g.new_vertex_property("int32_t")
+        new_partition.a = numpy.arange(len(new_partition.a))
+        if no_edges:
+            return new_partition
+
+    libgraph_tool_community.louvain(g._Graph__graph, _prop("e", g, weight),
+                                    _prop("v", g, new_partition),
+                                    _prop("v", g, frontier), threshold,
+                                    verbose)
     return new_partition
-
-def deltas(g,x,partition,c2v,new_community,s2,d,w=None,kw=None,m=None):
-    r"""
-    Calculate the increase in modularity if a node is moved
-    from its current community to a new one.
-
-    Parameters
-    ----------
-    g : :class:`~g_tool.Graph`
-        Graph to be used. Only undirected graphs are supported.
-    x : :class:`~g_tool.Vertex`
-        The vertex that would be moved.
-    partition : :class:`~g_tool.PropertyMap` (optional, default: None)
-        The current partitioning of the graph.
-    new_community: int
-        The community where the node should be moved to.
-    w : :class:`~g_tool.PropertyMap` (optional, default: None)
-        Edge property map with the optional edge weights.
-    kw : :class:`~g_tool.PropertyMap` (optional, default: None)
-        Vertex property map with the (weighted) degree of each node.
-    m : float (optional, default: False)
-        Double of the total weight of the graph, i.e.:
-
-    .. math::
-
-          m = \sum_{ij} A_{ij}
-
-    where i and j are vertex of the graph and A is the adjacency matrix
-    of the graph.
-
-    Returns
-    -------
-    deltaq : float
-        The increase in modularity.
-    kw : :class:`~g_tool.PropertyMap`
-        Vertex property map with the (weighted) degree of each node.
-    m : float
-        Double of the total weight of the graph.
-
-    Notes
-    -------
-    """
-    
-    #evaluates the weighted degree, if needed
-    if not kw:
-        kw = g.degree_property_map('total',w)
-        
-    #the increase in modularity depends on the weight of the edges
-    #from vertex x to the current and the new communities.
-    #we don't want to consider self loops
-    if w:
-        delta = sum([w[e] for e in x.all_edges() if e.target() in c2v[new_community][0]])
-    else:
-        delta = sum([1 for e in x.all_edges() if e.target() in c2v[new_community]])
-    delta = delta-d
-    #print("Delta=",delta)
-    s1 = sum([kw[v] for v in c2v[new_community]])
-    s = s1-s2+kw[x]
-    #print("s=",s)
-    if not m:    
-        m = sum([kw[v] for v in g.vertices()])
-        
-    deltaq = 2*(delta - (kw[x]/m)*s)/m
-    return deltaq,kw,m
-
-def reverse_dict(d,keys=None):
-    if not keys:
-        keys = d.keys()
-
-    c2v = dict()
-    
-    for v in keys:
-        if d[v] in c2v:
-            c2v[d[v]].add(v)
-        else:
-            c2v[d[v]]=set([v])
-
-    return c2v